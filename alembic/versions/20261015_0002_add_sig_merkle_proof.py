@@ -0,0 +1,26 @@
+"""add merkle proof column for batch-signed versions
+
+Revision ID: 20261015_0002
+Revises: 20260304_0001
+Create Date: 2026-10-15 00:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261015_0002"
+down_revision: Union[str, None] = "20260304_0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("action_versions", sa.Column("sig_merkle_proof", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("action_versions", "sig_merkle_proof")
@@ -1,8 +1,23 @@
 import json
 import hashlib
 import base64
+from functools import lru_cache
+from typing import Iterable
 from cryptography.hazmat.primitives.asymmetric import ed25519
-from cryptography.exceptions import InvalidSignature
+
+from app.settings import ED25519_BACKEND
+
+try:
+    from nacl.signing import VerifyKey
+except ImportError:  # optional: installed with the "pynacl" extra
+    VerifyKey = None
+
+# Bound once so the hot hashing helpers skip the module attribute lookup.
+_sha256 = hashlib.sha256
+
+# Built once: json.dumps constructs a fresh encoder for every call with
+# non-default options. Output is byte-identical to the json.dumps form.
+_canonical_encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'), ensure_ascii=False)
 
 def canonical_dumps(obj) -> bytes:
     """
@@ -12,19 +27,28 @@ def canonical_dumps(obj) -> bytes:
     - Keys sorted recursively
     - No whitespace (separators=(',', ':'))
     """
-    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return _canonical_encoder.encode(obj).encode('utf-8')
+
+def canonical_sha256(obj) -> bytes:
+    """
+    Returns the SHA-256 digest of the canonical JSON form of the object.
+
+    Equivalent to sha256_bytes(canonical_dumps(obj)) in a single call, for the
+    read path where only the digest is needed.
+    """
+    return _sha256(_canonical_encoder.encode(obj).encode('utf-8')).digest()
 
 def sha256_bytes(payload: bytes) -> bytes:
     """
     Computes the SHA-256 hash of the payload and returns it as bytes.
     """
-    return hashlib.sha256(payload).digest()
+    return _sha256(payload).digest()
 
 def sha256_hex(payload: bytes) -> str:
     """
     Computes the SHA-256 hash of the payload and returns it as a hex string.
     """
-    return hashlib.sha256(payload).hexdigest()
+    return _sha256(payload).hexdigest()
 
 def sha256_prefixed_hex(payload: bytes) -> str:
     """
@@ -32,6 +56,36 @@ def sha256_prefixed_hex(payload: bytes) -> str:
     """
     return f"sha256:{sha256_hex(payload)}"
 
+def sha256_with_prefixed_hex(payload: bytes) -> tuple[bytes, str]:
+    """
+    Computes the SHA-256 hash once and returns both the raw digest and 'sha256:<hex>'.
+    """
+    digest = _sha256(payload).digest()
+    return digest, f"sha256:{digest.hex()}"
+
+def merkle_root_sha256(leaf_hash: bytes, proof: list[str]) -> bytes:
+    """
+    Recomputes a Merkle batch root from a leaf hash and its inclusion proof.
+
+    Each proof entry is a sibling node formatted as 'sha256:<hex>'. Parent
+    nodes are SHA-256(0x01 || min(a, b) || max(a, b)); ordering the pair
+    makes the proof position-free, and the 0x01 prefix keeps interior nodes
+    distinct from leaf hashes.
+
+    Raises:
+        ValueError: If a proof entry is not a 32-byte 'sha256:<hex>' digest.
+    """
+    node = leaf_hash
+    for entry in proof:
+        if not entry.startswith("sha256:"):
+            raise ValueError(f"Unsupported merkle proof entry: {entry!r}")
+        sibling = bytes.fromhex(entry[7:])
+        if len(sibling) != 32:
+            raise ValueError(f"Merkle proof entry is not a SHA-256 digest: {entry!r}")
+        low, high = sorted((node, sibling))
+        node = _sha256(b"\x01" + low + high).digest()
+    return node
+
 def verify_signature_ed25519(hash_bytes: bytes, sig_b64: str, public_key_bytes: bytes) -> bool:
     """
     Verifies an Ed25519 signature.
@@ -44,13 +98,73 @@ def verify_signature_ed25519(hash_bytes: bytes, sig_b64: str, public_key_bytes:
     Returns:
         True if the signature is valid, False otherwise.
     """
-    try:
-        if sig_b64.startswith("base64:"):
-            sig_b64 = sig_b64[7:]
-        sig_bytes = base64.b64decode(sig_b64)
+    return _verify_ed25519_cached(hash_bytes, sig_b64, public_key_bytes)
+
+@lru_cache(maxsize=256)
+def _load_ed25519_public_key(public_key_bytes: bytes) -> ed25519.Ed25519PublicKey:
+    """
+    Parses a raw Ed25519 public key once per distinct key.
 
-        public_key = ed25519.Ed25519PublicKey.from_public_bytes(public_key_bytes)
-        public_key.verify(sig_bytes, hash_bytes)
+    The trust store holds a handful of stable keys, so this keeps point
+    decoding off the per-verify path. Invalid keys raise and are not cached.
+    """
+    return ed25519.Ed25519PublicKey.from_public_bytes(public_key_bytes)
+
+@lru_cache(maxsize=256)
+def _load_pynacl_verify_key(public_key_bytes: bytes) -> "VerifyKey":
+    """
+    libsodium counterpart of _load_ed25519_public_key.
+    """
+    return VerifyKey(public_key_bytes)
+
+def _verify_with_cryptography(hash_bytes: bytes, sig_bytes: bytes, public_key_bytes: bytes) -> None:
+    _load_ed25519_public_key(public_key_bytes).verify(sig_bytes, hash_bytes)
+
+def _verify_with_pynacl(hash_bytes: bytes, sig_bytes: bytes, public_key_bytes: bytes) -> None:
+    _load_pynacl_verify_key(public_key_bytes).verify(hash_bytes, sig_bytes)
+
+def _select_ed25519_verifier(backend: str):
+    """
+    Resolves the configured Ed25519 backend, falling back to cryptography
+    when the name is unknown or PyNaCl is not installed.
+    """
+    if backend == "pynacl":
+        if VerifyKey is not None:
+            return _verify_with_pynacl
+        print("Warning: ACTION_REGISTRY_ED25519_BACKEND=pynacl but PyNaCl is not installed; using cryptography")
+    elif backend != "cryptography":
+        print(f"Warning: Unknown ACTION_REGISTRY_ED25519_BACKEND '{backend}'; using cryptography")
+    return _verify_with_cryptography
+
+_verify_ed25519 = _select_ed25519_verifier(ED25519_BACKEND)
+
+def preload_ed25519_public_keys(public_keys: Iterable[bytes]) -> None:
+    """
+    Parses trust-store keys for the active backend ahead of the first request.
+
+    Malformed keys are skipped here; they still fail at verification time.
+    """
+    loader = _load_pynacl_verify_key if _verify_ed25519 is _verify_with_pynacl else _load_ed25519_public_key
+    for public_key_bytes in public_keys:
+        try:
+            loader(public_key_bytes)
+        except Exception:
+            continue
+
+@lru_cache(maxsize=4096)
+def _verify_ed25519_cached(hash_bytes: bytes, sig_b64: str, public_key_bytes: bytes) -> bool:
+    """
+    Ed25519 verification memoized on its exact inputs.
+
+    Stored versions are immutable, so repeat reads verify the same
+    (hash, signature, key) triple. The cache is keyed on the stored base64
+    string, so hits skip the decode as well as the curve arithmetic. Keying on
+    the raw public key rather than the kid keeps results correct if a kid is
+    rebound to a different key.
+    """
+    try:
+        sig_bytes = base64.b64decode(sig_b64.removeprefix("base64:"))
+        _verify_ed25519(hash_bytes, sig_bytes, public_key_bytes)
         return True
     except Exception:
         return False
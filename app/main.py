@@ -1,3 +1,4 @@
+import hmac
 import json
 import logging
 import time
@@ -12,21 +13,28 @@ from alembic.script import ScriptDirectory
 from fastapi import Depends, FastAPI, Header, Query, Request
 from fastapi.responses import JSONResponse, Response
 from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.crypto import canonical_dumps, sha256_bytes, sha256_prefixed_hex, verify_signature_ed25519
+from app.crypto import (
+    canonical_dumps,
+    canonical_sha256,
+    merkle_root_sha256,
+    preload_ed25519_public_keys,
+    sha256_hex,
+    sha256_with_prefixed_hex,
+    verify_signature_ed25519,
+)
 from app.db import async_engine, get_db
 from app.models import Action, ActionVersion, Base
 from app.schemas import (
-    ActionItem,
     ActionList,
     ActionVerifyResponse,
     ActionVersionResponse,
     ErrorResponse,
     PublishRequest,
-    SignatureBlock,
 )
-from app.settings import API_KEY, TRUSTED_KEYS
+from app.settings import API_KEY, TRUSTED_KEYS, init_trusted_keys
 
 app = FastAPI(
     title="Action Registry API",
@@ -56,12 +64,37 @@ METRICS = {
 LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
 
 
+def _encode_error_body(code: str, message: str) -> bytes:
+    # Encoded the same way JSONResponse would.
+    return json.dumps(
+        {"error": {"code": code, "message": message, "details": None}},
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+# Only for fixed messages (401, bad signature): bodies that echo caller input,
+# such as the 404s, would mostly miss and could evict the ones that repeat.
+_encode_static_error_body = lru_cache(maxsize=32)(_encode_error_body)
+
+
 def create_error_response(
     status_code: int,
     code: str,
     message: str,
     details: Optional[Dict[str, Any]] = None,
-) -> JSONResponse:
+    static_message: bool = False,
+) -> Response:
+    if details is None:
+        encode = _encode_static_error_body if static_message else _encode_error_body
+        return Response(
+            content=encode(code, message),
+            status_code=status_code,
+            media_type="application/json",
+        )
+
     content = {
         "error": {
             "code": code,
@@ -80,9 +113,6 @@ def _version_sort_key(version: str) -> tuple[int, int, int, str]:
 
 
 def _verify_action_version(av: ActionVersion) -> tuple[bool, Optional[str]]:
-    canonical_bytes = canonical_dumps(av.schema_json)
-    hash_bytes_val = sha256_bytes(canonical_bytes)
-
     trusted_entry = TRUSTED_KEYS.get(av.sig_kid)
     if not trusted_entry:
         METRICS["verify_fail_total"] += 1
@@ -93,6 +123,16 @@ def _verify_action_version(av: ActionVersion) -> tuple[bool, Optional[str]]:
         METRICS["verify_fail_total"] += 1
         return False, f"Unsupported algorithm in trust store: {alg}"
 
+    # Canonicalize only once the key is usable; the digest is always re-derived
+    # from the stored schema so tampered rows are caught.
+    hash_bytes_val = canonical_sha256(av.schema_json)
+    if av.sig_merkle_proof:
+        try:
+            hash_bytes_val = merkle_root_sha256(hash_bytes_val, av.sig_merkle_proof)
+        except ValueError:
+            METRICS["verify_fail_total"] += 1
+            return False, "Malformed merkle proof"
+
     is_valid = verify_signature_ed25519(
         hash_bytes=hash_bytes_val,
         sig_b64=av.sig_b64,
@@ -107,6 +147,68 @@ def _verify_action_version(av: ActionVersion) -> tuple[bool, Optional[str]]:
     return False, "Bad signature"
 
 
+def _action_version_content(
+    av: ActionVersion,
+    verified: bool,
+    verify_error: Optional[str],
+) -> Dict[str, Any]:
+    # Shaped like ActionVersionResponse; handlers return it directly so FastAPI
+    # does not rebuild and revalidate the model on every read.
+    return {
+        "name": av.name,
+        "version": av.version,
+        "schema": av.schema_json,
+        "hash": av.hash,
+        "signature": {
+            "alg": av.sig_alg,
+            "kid": av.sig_kid,
+            "sig": av.sig_b64,
+            "merkle_proof": av.sig_merkle_proof,
+        },
+        "verified": verified,
+        "verify_error": verify_error,
+    }
+
+
+async def _find_action_version(db: AsyncSession, name: str, version: str) -> Optional[ActionVersion]:
+    result = await db.execute(
+        select(ActionVersion).where(ActionVersion.name == name, ActionVersion.version == version)
+    )
+    return result.scalars().first()
+
+
+async def _load_action_version(
+    db: AsyncSession,
+    name: str,
+    version: str,
+) -> tuple[Optional[ActionVersion], Optional[Response]]:
+    # One query on the happy path; the action lookup only runs to pick the 404 code.
+    row = await _find_action_version(db, name, version)
+    if row:
+        return row, None
+
+    if not await db.get(Action, name):
+        return None, create_error_response(404, "ACTION_NOT_FOUND", f"Action '{name}' not found")
+    return None, create_error_response(404, "VERSION_NOT_FOUND", f"Version '{version}' not found")
+
+
+@lru_cache(maxsize=32)
+def _verdict_tag(verified: bool, verify_error: Optional[str]) -> str:
+    # Verdicts come from a small server-side set, so this stays tiny. Hashing keeps
+    # the ETag header-safe whatever the error text contains.
+    return sha256_hex(json.dumps([verified, verify_error]).encode("utf-8"))[:12]
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
 @lru_cache(maxsize=1)
 def get_expected_migration_head() -> Optional[str]:
     alembic_ini = Path(__file__).resolve().parents[1] / "alembic.ini"
@@ -156,6 +258,15 @@ async def request_context_middleware(request: Request, call_next):
 
 @app.on_event("startup")
 async def on_startup() -> None:
+    # Warm per-process state so the first requests don't pay for key parsing
+    # or the Alembic script scan behind /readyz.
+    init_trusted_keys()
+    preload_ed25519_public_keys(pub for alg, pub in TRUSTED_KEYS.values() if alg == "ed25519")
+    try:
+        get_expected_migration_head()
+    except Exception as exc:
+        # /readyz reports migration problems; a failed warm-up must not block startup.
+        logger.warning(json.dumps({"event": "migration_head_warmup_failed", "reason": str(exc)}))
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
@@ -269,42 +380,45 @@ async def list_actions(
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=50, ge=1, le=200),
     db: AsyncSession = Depends(get_db),
-) -> ActionList:
-    rows = (await db.execute(select(ActionVersion))).scalars().all()
+) -> JSONResponse:
+    # Columns only: no ORM identity-map entries, and the description is pulled
+    # out in SQL so full schema documents are never decoded here.
+    stmt = select(
+        ActionVersion.name,
+        ActionVersion.version,
+        ActionVersion.schema_json["description"].as_string(),
+    )
+    if kid:
+        stmt = stmt.where(ActionVersion.sig_kid == kid)
+    rows = (await db.execute(stmt)).all()
 
-    grouped: dict[str, list[ActionVersion]] = defaultdict(list)
+    grouped: dict[str, list[tuple[str, Optional[str]]]] = defaultdict(list)
     q_lower = q.lower().strip()
 
-    for row in rows:
-        if kid and row.sig_kid != kid:
-            continue
-        description = str(row.schema_json.get("description", ""))
-        if q_lower and q_lower not in row.name.lower() and q_lower not in description.lower():
+    for name, version, description in rows:
+        if q_lower and q_lower not in name.lower() and q_lower not in (description or "").lower():
             continue
-        grouped[row.name].append(row)
+        grouped[name].append((version, description))
 
     action_names = sorted(grouped.keys())
     page_names = action_names[offset : offset + limit]
 
     items = []
     for name in page_names:
-        versions = sorted((row.version for row in grouped[name]), key=_version_sort_key)
-        latest = versions[-1] if versions else "0.0.0"
-        latest_row = next((row for row in grouped[name] if row.version == latest), None)
-        description = None
-        if latest_row:
-            description = latest_row.schema_json.get("description")
+        # Sort once; the latest version falls out of the same pass.
+        version_rows = sorted(grouped[name], key=lambda entry: _version_sort_key(entry[0]))
+        latest_version, latest_description = version_rows[-1]
 
         items.append(
-            ActionItem(
-                name=name,
-                latest_version=latest,
-                versions=versions,
-                description=description,
-            )
+            {
+                "name": name,
+                "latest_version": latest_version,
+                "versions": [version for version, _ in version_rows],
+                "description": latest_description,
+            }
         )
 
-    return ActionList(items=items)
+    return JSONResponse(content={"items": items})
 
 
 @app.get(
@@ -313,32 +427,36 @@ async def list_actions(
     summary="Fetch Versioned Action Schema",
     description=(
         "Returns a specific action version including schema payload, stored signature block, "
-        "hash, and live verification result."
+        "hash, and live verification result. The ETag covers the payload hash and verification "
+        "result; a matching If-None-Match returns 304."
     ),
-    responses={404: {"model": ErrorResponse}, 400: {"model": ErrorResponse}},
+    responses={
+        304: {"description": "Client copy is current (If-None-Match matched the ETag)."},
+        404: {"model": ErrorResponse},
+        400: {"model": ErrorResponse},
+    },
 )
-async def get_action_version(name: str, version: str, db: AsyncSession = Depends(get_db)):
-    action = await db.get(Action, name)
-    if not action:
-        return create_error_response(404, "ACTION_NOT_FOUND", f"Action '{name}' not found")
-
-    row_result = await db.execute(
-        select(ActionVersion).where(ActionVersion.name == name, ActionVersion.version == version)
-    )
-    row = row_result.scalars().first()
-    if not row:
-        return create_error_response(404, "VERSION_NOT_FOUND", f"Version '{version}' not found")
+async def get_action_version(
+    name: str,
+    version: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+):
+    row, error_response = await _load_action_version(db, name, version)
+    if error_response:
+        return error_response
 
+    # Verify before answering a conditional request: `verified` and `verify_error`
+    # follow the trust store, so they have to be part of the validator or a 304
+    # could keep a client on a stale verdict.
     is_verified, verify_error = _verify_action_version(row)
+    etag = f'"{row.hash}.{_verdict_tag(is_verified, verify_error)}"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
 
-    return ActionVersionResponse(
-        name=name,
-        version=version,
-        schema=row.schema_json,
-        hash=row.hash,
-        signature=SignatureBlock(alg=row.sig_alg, kid=row.sig_kid, sig=row.sig_b64),
-        verified=is_verified,
-        verify_error=verify_error,
+    return JSONResponse(
+        content=_action_version_content(row, is_verified, verify_error),
+        headers={"ETag": etag},
     )
 
 
@@ -353,27 +471,32 @@ async def get_action_version(name: str, version: str, db: AsyncSession = Depends
     responses={404: {"model": ErrorResponse}},
 )
 async def verify_action_version(name: str, version: str, db: AsyncSession = Depends(get_db)):
-    action = await db.get(Action, name)
-    if not action:
-        return create_error_response(404, "ACTION_NOT_FOUND", f"Action '{name}' not found")
+    row, error_response = await _load_action_version(db, name, version)
+    if error_response:
+        return error_response
 
-    row_result = await db.execute(
-        select(ActionVersion).where(ActionVersion.name == name, ActionVersion.version == version)
+    is_verified, verify_error = _verify_action_version(row)
+
+    return JSONResponse(
+        content={
+            "name": name,
+            "version": version,
+            "verified": is_verified,
+            "kid": row.sig_kid,
+            "alg": row.sig_alg,
+            "hash": row.hash,
+            "verify_error": verify_error,
+        }
     )
-    row = row_result.scalars().first()
-    if not row:
-        return create_error_response(404, "VERSION_NOT_FOUND", f"Version '{version}' not found")
 
-    is_verified, verify_error = _verify_action_version(row)
 
-    return ActionVerifyResponse(
-        name=name,
-        version=version,
-        verified=is_verified,
-        kid=row.sig_kid,
-        alg=row.sig_alg,
-        hash=row.hash,
-        verify_error=verify_error,
+def _existing_version_response(existing: ActionVersion, name: str, version: str, hash_hex: str) -> Response:
+    if existing.hash == hash_hex:
+        return JSONResponse(status_code=200, content=_action_version_content(existing, True, None))
+    return create_error_response(
+        409,
+        "IMMUTABLE_VERSION_CONFLICT",
+        f"Version '{version}' of '{name}' already exists with a different schema",
     )
 
 
@@ -395,15 +518,14 @@ async def publish_action(
     x_api_key: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
 ):
-    if not API_KEY or not x_api_key or x_api_key != API_KEY:
-        return create_error_response(401, "UNAUTHORIZED", "Invalid or missing API key")
+    if not API_KEY or not x_api_key or not hmac.compare_digest(x_api_key.encode(), API_KEY.encode()):
+        return create_error_response(401, "UNAUTHORIZED", "Invalid or missing API key", static_message=True)
 
     schema_obj = body.schema_
     sig_data = body.signature
 
     canonical_bytes = canonical_dumps(schema_obj)
-    hash_bytes_val = sha256_bytes(canonical_bytes)
-    hash_hex = sha256_prefixed_hex(canonical_bytes)
+    hash_bytes_val, hash_hex = sha256_with_prefixed_hex(canonical_bytes)
 
     trusted_entry = TRUSTED_KEYS.get(sig_data.kid)
     if not trusted_entry:
@@ -417,69 +539,58 @@ async def publish_action(
     if alg != "ed25519":
         return create_error_response(400, "UNKNOWN_KEY_ID", f"Unsupported algorithm in trust store: {alg}")
 
+    signed_bytes = hash_bytes_val
+    if sig_data.merkle_proof:
+        try:
+            signed_bytes = merkle_root_sha256(hash_bytes_val, sig_data.merkle_proof)
+        except ValueError as exc:
+            return create_error_response(400, "BAD_SIGNATURE", "Malformed merkle proof", {"reason": str(exc)})
+
     if not verify_signature_ed25519(
-        hash_bytes=hash_bytes_val,
+        hash_bytes=signed_bytes,
         sig_b64=sig_data.sig,
         public_key_bytes=pub_key_bytes,
     ):
         METRICS["verify_fail_total"] += 1
-        return create_error_response(400, "BAD_SIGNATURE", "Signature verification failed")
+        return create_error_response(400, "BAD_SIGNATURE", "Signature verification failed", static_message=True)
 
     METRICS["verify_pass_total"] += 1
 
-    existing_result = await db.execute(
-        select(ActionVersion).where(ActionVersion.name == name, ActionVersion.version == version)
-    )
-    existing = existing_result.scalars().first()
+    existing = await _find_action_version(db, name, version)
     if existing:
-        if existing.hash == hash_hex:
-            return JSONResponse(
-                status_code=200,
-                content={
-                    "name": name,
-                    "version": version,
-                    "schema": existing.schema_json,
-                    "hash": existing.hash,
-                    "signature": {
-                        "alg": existing.sig_alg,
-                        "kid": existing.sig_kid,
-                        "sig": existing.sig_b64,
-                    },
-                    "verified": True,
-                    "verify_error": None,
-                },
-            )
-        return create_error_response(
-            409,
-            "IMMUTABLE_VERSION_CONFLICT",
-            f"Version '{version}' of '{name}' already exists with a different schema",
+        return _existing_version_response(existing, name, version, hash_hex)
+
+    # A second attempt covers losing the race to create the actions row: another
+    # version of a new action committed first, so nothing is stored for this
+    # version yet and the retry finds the action in place.
+    for attempt in range(2):
+        if not await db.get(Action, name):
+            db.add(Action(name=name))
+
+        row = ActionVersion(
+            name=name,
+            version=version,
+            schema_json=schema_obj,
+            hash=hash_hex,
+            sig_alg=sig_data.alg,
+            sig_kid=sig_data.kid,
+            sig_b64=sig_data.sig,
+            sig_merkle_proof=sig_data.merkle_proof or None,
         )
-
-    action = await db.get(Action, name)
-    if not action:
-        action = Action(name=name)
-        db.add(action)
-
-    row = ActionVersion(
-        name=name,
-        version=version,
-        schema_json=schema_obj,
-        hash=hash_hex,
-        sig_alg=sig_data.alg,
-        sig_kid=sig_data.kid,
-        sig_b64=sig_data.sig,
-    )
-    db.add(row)
-    await db.commit()
+        db.add(row)
+        try:
+            await db.commit()
+            break
+        except IntegrityError:
+            await db.rollback()
+            # A concurrent publish of the same (name, version) committed first;
+            # answer as if it had already been there when we looked.
+            existing = await _find_action_version(db, name, version)
+            if existing:
+                return _existing_version_response(existing, name, version, hash_hex)
+            if attempt:
+                raise
 
     METRICS["publish_total"] += 1
 
-    return ActionVersionResponse(
-        name=name,
-        version=version,
-        schema=schema_obj,
-        hash=hash_hex,
-        signature=sig_data,
-        verified=True,
-        verify_error=None,
-    )
+    return JSONResponse(status_code=201, content=_action_version_content(row, True, None))
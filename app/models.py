@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 from sqlalchemy import DateTime, ForeignKey, Index, String, Text, UniqueConstraint, func
 from sqlalchemy.dialects.postgresql import JSONB
@@ -41,6 +42,7 @@ class ActionVersion(Base):
     sig_alg: Mapped[str] = mapped_column(String(32), nullable=False)
     sig_kid: Mapped[str] = mapped_column(String(255), nullable=False)
     sig_b64: Mapped[str] = mapped_column(Text, nullable=False)
+    sig_merkle_proof: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         nullable=False,
@@ -29,6 +29,15 @@ class SignatureBlock(BaseModel):
     alg: str = Field(..., description="Signature algorithm identifier.", examples=["ed25519"])
     kid: str = Field(..., description="Trusted key ID used for verification.", examples=["dev-root-1"])
     sig: str = Field(..., description="Detached base64 signature over canonical payload hash.", examples=["base64:abc..."])
+    merkle_proof: Optional[List[str]] = Field(
+        default=None,
+        max_length=64,
+        description=(
+            "Inclusion proof for batch-signed versions. When present, sig covers the Merkle root "
+            "rebuilt from the payload hash and these sibling hashes (at most 64, one per tree level)."
+        ),
+        examples=[["sha256:abc123..."]],
+    )
 
 class ActionVersionResponse(BaseModel):
     name: str = Field(..., description="Unique action identifier.")
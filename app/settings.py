@@ -70,6 +70,19 @@ def load_trusted_keys() -> Dict[str, Tuple[str, bytes]]:
 
     return trusted_keys
 
-TRUSTED_KEYS = load_trusted_keys()
+# Filled by init_trusted_keys() at app startup so importing settings stays free
+# of file reads and key decoding. Mutated in place: modules that imported the
+# dict by name see the loaded keys.
+TRUSTED_KEYS: Dict[str, Tuple[str, bytes]] = {}
+
+
+def init_trusted_keys() -> Dict[str, Tuple[str, bytes]]:
+    TRUSTED_KEYS.clear()
+    TRUSTED_KEYS.update(load_trusted_keys())
+    return TRUSTED_KEYS
+
 
 API_KEY = os.getenv("ACTION_REGISTRY_API_KEY")
+
+# "cryptography" (default, OpenSSL) or "pynacl" (libsodium; needs the pynacl extra).
+ED25519_BACKEND = os.getenv("ACTION_REGISTRY_ED25519_BACKEND", "cryptography")
@@ -0,0 +1,140 @@
+import asyncio
+import base64
+import json as jsonlib
+
+import httpx
+
+from app.crypto import canonical_dumps, sha256_bytes
+from app.main import app
+
+
+TEST_API_KEY = "test-secret-key"
+
+
+def run_async(coro):
+    return asyncio.run(coro)
+
+
+class ASGIClient:
+    def __init__(self):
+        # ASGITransport holds no sockets, so one client can serve every event loop
+        # that run_async spins up.
+        self._client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://testserver",
+        )
+
+    def request(self, method: str, path: str, **kwargs):
+        return run_async(self._client.request(method, path, **kwargs))
+
+    def close(self):
+        run_async(self._client.aclose())
+
+    def get(self, path: str, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+
+class ASGIResponse:
+    def __init__(self, status_code: int, headers: dict[str, str], content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+
+# Drives one request straight through the ASGI app, skipping httpx's URL
+# handling and transport. Response header names come back lower-cased.
+async def call(app, method: str, path: str, json=None, headers=None) -> ASGIResponse:
+    body = b"" if json is None else jsonlib.dumps(json).encode("utf-8")
+    raw_headers = [(b"host", b"testserver")]
+    if json is not None:
+        raw_headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+
+    request_sent = False
+    response_complete = asyncio.Event()
+    messages = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Like a real client, only hang up once the whole response is in.
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_complete.set()
+
+    await app(scope, receive, send)
+
+    start = messages[0]
+    return ASGIResponse(
+        status_code=start["status"],
+        headers={k.decode("latin-1"): v.decode("latin-1") for k, v in start.get("headers", [])},
+        content=b"".join(m.get("body", b"") for m in messages[1:]),
+    )
+
+
+# (public key, canonical payload) -> base64 signature, ready for a signature
+# block. Ed25519 signing is deterministic, so a payload signed once can be
+# served from here for the rest of the run.
+SIGNED: dict[tuple[bytes, bytes], str] = {}
+
+
+def signed_for(payload, key) -> str:
+    priv, pub_bytes = key
+    canonical = canonical_dumps(payload)
+    sig_b64 = SIGNED.get((pub_bytes, canonical))
+    if sig_b64 is None:
+        sig = priv.sign(sha256_bytes(canonical)).signature
+        sig_b64 = SIGNED[(pub_bytes, canonical)] = base64.b64encode(sig).decode("utf-8")
+    return sig_b64
+
+
+def merkle_node(a: bytes, b: bytes) -> bytes:
+    # Mirrors app.crypto.merkle_root_sha256: children are sorted, then hashed
+    # behind a 0x01 interior-node prefix.
+    low, high = sorted((a, b))
+    return sha256_bytes(b"\x01" + low + high)
+
+
+def generate_key_and_sig(payload, key):
+    priv, pub_bytes = key
+    return pub_bytes, signed_for(payload, key), priv
+
+
+def _publish(client, name, version, schema, sig_block, api_key=TEST_API_KEY):
+    headers = {}
+    if api_key is not None:
+        headers["x-api-key"] = api_key
+    return client.post(
+        f"/actions/{name}/versions/{version}",
+        json={"schema": schema, "signature": sig_block},
+        headers=headers,
+    )
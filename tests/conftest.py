@@ -0,0 +1,20 @@
+import pytest
+from nacl.signing import SigningKey
+
+from tests._helpers import ASGIClient
+
+
+@pytest.fixture(scope="session")
+def ed25519_key():
+    """One signing key for the whole run; tests only need *a* valid key pair."""
+    # Signing is test-only, so it goes straight to libsodium; the server under
+    # test still verifies through its configured backend.
+    sk = SigningKey.generate()
+    return sk, bytes(sk.verify_key)
+
+
+@pytest.fixture(scope="session")
+def asgi_client():
+    c = ASGIClient()
+    yield c
+    c.close()
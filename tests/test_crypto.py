@@ -1,8 +1,26 @@
 import pytest
 import base64
+import json
 from cryptography.hazmat.primitives.asymmetric import ed25519
 from cryptography.hazmat.primitives import serialization
-from app.crypto import canonical_dumps, sha256_hex, verify_signature_ed25519, sha256_bytes, sha256_prefixed_hex
+from nacl.exceptions import BadSignatureError
+from app.crypto import (
+    _load_ed25519_public_key,
+    _select_ed25519_verifier,
+    _verify_ed25519_cached,
+    _verify_with_cryptography,
+    _verify_with_pynacl,
+    canonical_dumps,
+    canonical_sha256,
+    merkle_root_sha256,
+    preload_ed25519_public_keys,
+    sha256_bytes,
+    sha256_hex,
+    sha256_prefixed_hex,
+    sha256_with_prefixed_hex,
+    verify_signature_ed25519,
+)
+from tests._helpers import merkle_node
 
 def test_canonical_dumps_determinism():
     obj1 = {"b": 2, "a": 1}
@@ -26,6 +44,15 @@ def test_canonical_dumps_utf8():
     expected = b'{"val":"\xc3\xa9"}'
     assert canonical_dumps(obj) == expected
 
+def test_canonical_dumps_matches_json_dumps():
+    obj = {"z": [1.5, 1e16, None, True], "a": {"é": "\u2028", "n": -0.0}, "m": 10**20}
+    expected = json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    assert canonical_dumps(obj) == expected
+
+def test_canonical_sha256():
+    obj = {"b": [1, {"y": "é", "x": None}], "a": 1}
+    assert canonical_sha256(obj) == sha256_bytes(canonical_dumps(obj))
+
 def test_sha256_hex():
     payload = b'test'
     # echo -n "test" | sha256sum
@@ -38,6 +65,12 @@ def test_sha256_prefixed_hex():
     expected = "sha256:9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
     assert sha256_prefixed_hex(payload) == expected
 
+def test_sha256_with_prefixed_hex():
+    payload = b'test'
+    digest, prefixed = sha256_with_prefixed_hex(payload)
+    assert digest == sha256_bytes(payload)
+    assert prefixed == sha256_prefixed_hex(payload)
+
 def test_verify_signature_real():
     # Generate keys
     private_key = ed25519.Ed25519PrivateKey.generate()
@@ -65,3 +98,80 @@ def test_verify_signature_real():
     # Verify failure (bad signature)
     bad_sig = base64.b64encode(b'x' * 64).decode('utf-8')
     assert verify_signature_ed25519(hash_bytes_val, bad_sig, pub_bytes_raw) is False
+
+def test_verify_signature_cached_on_repeat():
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    pub_bytes_raw = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    hash_bytes_val = sha256_bytes(canonical_dumps({"cached": True}))
+    sig_b64 = "base64:" + base64.b64encode(private_key.sign(hash_bytes_val)).decode('utf-8')
+
+    assert verify_signature_ed25519(hash_bytes_val, sig_b64, pub_bytes_raw) is True
+    hits_before = _verify_ed25519_cached.cache_info().hits
+    assert verify_signature_ed25519(hash_bytes_val, sig_b64, pub_bytes_raw) is True
+    assert _verify_ed25519_cached.cache_info().hits == hits_before + 1
+
+    # Same hash and signature under a different key must not reuse the result
+    other_pub = ed25519.Ed25519PrivateKey.generate().public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    assert verify_signature_ed25519(hash_bytes_val, sig_b64, other_pub) is False
+
+def test_public_key_parsed_once():
+    pub_bytes_raw = ed25519.Ed25519PrivateKey.generate().public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    assert _load_ed25519_public_key(pub_bytes_raw) is _load_ed25519_public_key(pub_bytes_raw)
+
+    other_pub = ed25519.Ed25519PrivateKey.generate().public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    preload_ed25519_public_keys([other_pub, b'short'])
+    hits_before = _load_ed25519_public_key.cache_info().hits
+    _load_ed25519_public_key(other_pub)
+    assert _load_ed25519_public_key.cache_info().hits == hits_before + 1
+
+    # Malformed key bytes fail verification instead of raising
+    assert verify_signature_ed25519(b'x' * 32, base64.b64encode(b'x' * 64).decode('utf-8'), b'short') is False
+
+def test_merkle_root_sha256():
+    leaves = [sha256_bytes(canonical_dumps({"n": n})) for n in range(3)]
+
+    n01 = merkle_node(leaves[0], leaves[1])
+    root = merkle_node(n01, leaves[2])
+
+    # Sibling order does not matter, so every leaf rebuilds the same root
+    assert merkle_root_sha256(leaves[0], [f"sha256:{leaves[1].hex()}", f"sha256:{leaves[2].hex()}"]) == root
+    assert merkle_root_sha256(leaves[1], [f"sha256:{leaves[0].hex()}", f"sha256:{leaves[2].hex()}"]) == root
+    assert merkle_root_sha256(leaves[2], [f"sha256:{n01.hex()}"]) == root
+
+    # Empty proof: the leaf is its own root
+    assert merkle_root_sha256(leaves[0], []) == leaves[0]
+
+    with pytest.raises(ValueError):
+        merkle_root_sha256(leaves[0], [leaves[1].hex()])
+    with pytest.raises(ValueError):
+        merkle_root_sha256(leaves[0], ["sha256:abcd"])
+
+def test_ed25519_backend_selection():
+    assert _select_ed25519_verifier("cryptography") is _verify_with_cryptography
+    assert _select_ed25519_verifier("bogus") is _verify_with_cryptography
+
+def test_verify_with_pynacl_backend():
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    pub_bytes_raw = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    hash_bytes_val = sha256_bytes(canonical_dumps({"backend": "pynacl"}))
+    sig = private_key.sign(hash_bytes_val)
+
+    assert _select_ed25519_verifier("pynacl") is _verify_with_pynacl
+    _verify_with_pynacl(hash_bytes_val, sig, pub_bytes_raw)
+    with pytest.raises(BadSignatureError):
+        _verify_with_pynacl(b'x' * 32, sig, pub_bytes_raw)
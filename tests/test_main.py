@@ -2,10 +2,7 @@ import asyncio
 import base64
 from unittest.mock import patch
 
-import httpx
 import pytest
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import ed25519
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
@@ -14,37 +11,31 @@ from app.crypto import canonical_dumps, sha256_bytes, sha256_prefixed_hex
 from app.db import get_db
 from app.main import app
 from app.models import Action, ActionVersion, Base
-from app.settings import TRUSTED_KEYS
-
-
-TEST_API_KEY = "test-secret-key"
-
-
-def run_async(coro):
-    return asyncio.run(coro)
-
-
-class ASGIClient:
-    def request(self, method: str, path: str, **kwargs):
-        async def _request():
-            transport = httpx.ASGITransport(app=app)
-            async with httpx.AsyncClient(
-                transport=transport,
-                base_url="http://testserver",
-            ) as client:
-                return await client.request(method, path, **kwargs)
-
-        return run_async(_request())
-
-    def get(self, path: str, **kwargs):
-        return self.request("GET", path, **kwargs)
-
-    def post(self, path: str, **kwargs):
-        return self.request("POST", path, **kwargs)
+from app.settings import TRUSTED_KEYS, init_trusted_keys
+from tests._helpers import (
+    TEST_API_KEY,
+    _publish,
+    call,
+    generate_key_and_sig,
+    merkle_node,
+    run_async,
+    signed_for,
+)
+
+# Payloads shared across tests, with their canonical bytes and digests worked
+# out once at import.
+PAYLOAD_FOO_BAR = {"foo": "bar"}
+CANON_FOO_BAR = canonical_dumps(PAYLOAD_FOO_BAR)
+HASH_FOO_BAR = sha256_bytes(CANON_FOO_BAR)
+
+PAYLOAD_ORIGINAL = {"description": "Original"}
+PAYLOAD_MODIFIED = {"description": "Modified"}
+CANON_MODIFIED = canonical_dumps(PAYLOAD_MODIFIED)
+HASH_MODIFIED = sha256_bytes(CANON_MODIFIED)
 
 
 @pytest.fixture()
-def client(tmp_path):
+def client(tmp_path, asgi_client):
     db_path = tmp_path / "test.db"
     engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
     TestingSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
@@ -71,7 +62,7 @@ def client(tmp_path):
 
     app.dependency_overrides[get_db] = override_get_db
 
-    yield ASGIClient(), TestingSessionLocal
+    yield asgi_client, TestingSessionLocal
 
     app.dependency_overrides.clear()
 
@@ -83,58 +74,38 @@ def client(tmp_path):
     run_async(_teardown_models())
 
 
-def generate_key_and_sig(payload):
-    priv = ed25519.Ed25519PrivateKey.generate()
-    pub = priv.public_key()
-    pub_bytes = pub.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
-
-    canonical = canonical_dumps(payload)
-    hash_val = sha256_bytes(canonical)
-    sig = priv.sign(hash_val)
-    sig_b64 = base64.b64encode(sig).decode("utf-8")
-
-    return pub_bytes, sig_b64, priv
-
-
-def seed_action(db_factory, name: str, version: str, schema: dict, sig_alg: str, sig_kid: str, sig_b64: str):
-    async def _seed():
-        async with db_factory() as db:
-            if not await db.get(Action, name):
-                db.add(Action(name=name))
-            db.add(
-                ActionVersion(
-                    name=name,
-                    version=version,
-                    schema_json=schema,
-                    hash=sha256_prefixed_hex(canonical_dumps(schema)),
-                    sig_alg=sig_alg,
-                    sig_kid=sig_kid,
-                    sig_b64=sig_b64,
-                )
+async def seed_action_async(
+    db_factory, name: str, version: str, schema: dict, sig_alg: str, sig_kid: str, sig_b64: str
+):
+    async with db_factory() as db:
+        if not await db.get(Action, name):
+            db.add(Action(name=name))
+        db.add(
+            ActionVersion(
+                name=name,
+                version=version,
+                schema_json=schema,
+                hash=sha256_prefixed_hex(canonical_dumps(schema)),
+                sig_alg=sig_alg,
+                sig_kid=sig_kid,
+                sig_b64=sig_b64,
             )
-            await db.commit()
+        )
+        await db.commit()
 
-    run_async(_seed())
 
+def seed_action(db_factory, name: str, version: str, schema: dict, sig_alg: str, sig_kid: str, sig_b64: str):
+    run_async(seed_action_async(db_factory, name, version, schema, sig_alg, sig_kid, sig_b64))
 
-def seed_action_name(db_factory, name: str):
-    async def _seed():
-        async with db_factory() as db:
-            db.add(Action(name=name))
-            await db.commit()
 
-    run_async(_seed())
+async def seed_action_name_async(db_factory, name: str):
+    async with db_factory() as db:
+        db.add(Action(name=name))
+        await db.commit()
 
 
-def _publish(client, name, version, schema, sig_block, api_key=TEST_API_KEY):
-    headers = {}
-    if api_key is not None:
-        headers["x-api-key"] = api_key
-    return client.post(
-        f"/actions/{name}/versions/{version}",
-        json={"schema": schema, "signature": sig_block},
-        headers=headers,
-    )
+def seed_action_name(db_factory, name: str):
+    run_async(seed_action_name_async(db_factory, name))
 
 
 def test_healthz(client):
@@ -172,236 +143,452 @@ def test_readyz_fails_when_migrations_behind(client):
     assert body["error"]["code"] == "NOT_READY_MIGRATIONS"
 
 
-def test_list_actions(client):
-    c, db_factory = client
+def test_trusted_keys_loaded_on_init(monkeypatch):
+    pub_b64 = base64.b64encode(b"k" * 32).decode("utf-8")
+    monkeypatch.setenv("TRUSTED_KEYS_JSON", f'[{{"kid":"env-key","alg":"ed25519","public_key":"base64:{pub_b64}"}}]')
+
+    with patch.dict(TRUSTED_KEYS, {"stale-key": ("ed25519", b"s" * 32)}, clear=True):
+        init_trusted_keys()
+        assert TRUSTED_KEYS == {"env-key": ("ed25519", b"k" * 32)}
+        # main imported the same dict object, so it sees the loaded keys
+        assert main_module.TRUSTED_KEYS is TRUSTED_KEYS
+
+
+@pytest.mark.asyncio
+async def test_list_actions(client, ed25519_key, monkeypatch):
+    _, db_factory = client
     payload1 = {"description": "Move v1", "parameters": {"source": {"type": "string"}}}
     payload2 = {
         "description": "Move v2",
         "parameters": {"source": {"type": "string"}, "overwrite": {"type": "boolean"}},
     }
-    pub_bytes, sig1, priv = generate_key_and_sig(payload1)
-    sig2 = base64.b64encode(priv.sign(sha256_bytes(canonical_dumps(payload2)))).decode("utf-8")
+    pub_bytes, sig1, _ = generate_key_and_sig(payload1, ed25519_key)
+    sig2 = signed_for(payload2, ed25519_key)
+
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"test-key": ("ed25519", pub_bytes)})
+
+    await seed_action_async(db_factory, "files.move", "1.0.0", payload1, "ed25519", "test-key", sig1)
+    await seed_action_async(db_factory, "files.move", "1.1.0", payload2, "ed25519", "test-key", sig2)
+
+    response = await call(app, "GET", "/actions")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["items"]) == 1
+    item = data["items"][0]
+    assert item["name"] == "files.move"
+    assert item["latest_version"] == "1.1.0"
+    assert item["versions"] == ["1.0.0", "1.1.0"]
+    assert item["description"] == "Move v2"
+
+
+def test_list_actions_semver_ordering(client, ed25519_key, monkeypatch):
+    c, db_factory = client
+    payload = {"description": "Move file"}
+    pub_bytes, sig, _ = generate_key_and_sig(payload, ed25519_key)
+
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"test-key": ("ed25519", pub_bytes)})
 
-    with patch.dict(TRUSTED_KEYS, {"test-key": ("ed25519", pub_bytes)}, clear=True):
-        seed_action(db_factory, "files.move", "1.0.0", payload1, "ed25519", "test-key", sig1)
-        seed_action(db_factory, "files.move", "1.1.0", payload2, "ed25519", "test-key", sig2)
+    for version in ("1.10.0", "1.2.0", "1.9.3"):
+        seed_action(db_factory, "files.move", version, payload, "ed25519", "test-key", sig)
 
-        response = c.get("/actions")
-        assert response.status_code == 200
-        data = response.json()
-        assert len(data["items"]) == 1
-        item = data["items"][0]
-        assert item["name"] == "files.move"
-        assert item["latest_version"] == "1.1.0"
-        assert item["versions"] == ["1.0.0", "1.1.0"]
+    item = c.get("/actions").json()["items"][0]
+    assert item["versions"] == ["1.2.0", "1.9.3", "1.10.0"]
+    assert item["latest_version"] == "1.10.0"
 
 
-def test_list_actions_filters_and_pagination(client):
+def test_list_actions_filters_and_pagination(client, ed25519_key, monkeypatch):
     c, db_factory = client
     payload = {"description": "SSH command execution", "parameters": {"cmd": {"type": "string"}}}
-    pub_bytes, sig, _ = generate_key_and_sig(payload)
+    pub_bytes, sig, _ = generate_key_and_sig(payload, ed25519_key)
+
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"dev-root-1": ("ed25519", pub_bytes)})
+
+    seed_action(db_factory, "ssh.exec", "1.0.0", payload, "ed25519", "dev-root-1", sig)
+    seed_action(db_factory, "files.move", "1.0.0", {"description": "Move file"}, "ed25519", "dev-root-1", sig)
 
-    with patch.dict(TRUSTED_KEYS, {"dev-root-1": ("ed25519", pub_bytes)}, clear=True):
-        seed_action(db_factory, "ssh.exec", "1.0.0", payload, "ed25519", "dev-root-1", sig)
-        seed_action(db_factory, "files.move", "1.0.0", {"description": "Move file"}, "ed25519", "dev-root-1", sig)
+    by_query = c.get("/actions", params={"q": "ssh"})
+    assert by_query.status_code == 200
+    assert [x["name"] for x in by_query.json()["items"]] == ["ssh.exec"]
 
-        by_query = c.get("/actions", params={"q": "ssh"})
-        assert by_query.status_code == 200
-        assert [x["name"] for x in by_query.json()["items"]] == ["ssh.exec"]
+    by_kid = c.get("/actions", params={"kid": "dev-root-1"})
+    assert by_kid.status_code == 200
+    assert len(by_kid.json()["items"]) == 2
 
-        by_kid = c.get("/actions", params={"kid": "dev-root-1"})
-        assert by_kid.status_code == 200
-        assert len(by_kid.json()["items"]) == 2
+    other_kid = c.get("/actions", params={"kid": "other-key"})
+    assert other_kid.status_code == 200
+    assert other_kid.json()["items"] == []
 
-        paged = c.get("/actions", params={"offset": 1, "limit": 1})
-        assert paged.status_code == 200
-        assert len(paged.json()["items"]) == 1
+    by_description = c.get("/actions", params={"q": "command"})
+    assert [x["name"] for x in by_description.json()["items"]] == ["ssh.exec"]
 
+    paged = c.get("/actions", params={"offset": 1, "limit": 1})
+    assert paged.status_code == 200
+    assert len(paged.json()["items"]) == 1
 
-def test_get_action_success(client):
+
+def test_get_action_success(client, ed25519_key, monkeypatch):
     c, db_factory = client
-    payload = {"foo": "bar"}
-    pub_bytes, sig_b64, _ = generate_key_and_sig(payload)
+    payload = PAYLOAD_FOO_BAR
+    pub_bytes, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
 
-    with patch.dict(TRUSTED_KEYS, {"test-key": ("ed25519", pub_bytes)}, clear=True):
-        seed_action(db_factory, "test.action", "1.0.0", payload, "ed25519", "test-key", sig_b64)
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"test-key": ("ed25519", pub_bytes)})
 
-        response = c.get("/actions/test.action/versions/1.0.0")
-        assert response.status_code == 200
-        data = response.json()
-        assert data["verified"] is True
-        assert data["verify_error"] is None
+    seed_action(db_factory, "test.action", "1.0.0", payload, "ed25519", "test-key", sig_b64)
 
+    response = c.get("/actions/test.action/versions/1.0.0")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["verified"] is True
+    assert data["verify_error"] is None
 
-def test_get_action_tamper(client):
+
+def test_get_action_etag_not_modified(client, ed25519_key, monkeypatch):
     c, db_factory = client
-    payload = {"foo": "bar"}
-    tampered_payload = {"foo": "baz"}
-    pub_bytes, sig_b64, _ = generate_key_and_sig(payload)
+    payload = PAYLOAD_FOO_BAR
+    pub_bytes, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
+
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"test-key": ("ed25519", pub_bytes)})
+
+    seed_action(db_factory, "test.action", "1.0.0", payload, "ed25519", "test-key", sig_b64)
 
-    with patch.dict(TRUSTED_KEYS, {"test-key": ("ed25519", pub_bytes)}, clear=True):
-        seed_action(db_factory, "test.action", "1.0.0", tampered_payload, "ed25519", "test-key", sig_b64)
+    first = c.get("/actions/test.action/versions/1.0.0")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith(f'"sha256:{HASH_FOO_BAR.hex()}.')
 
-        response = c.get("/actions/test.action/versions/1.0.0")
-        assert response.status_code == 200
-        data = response.json()
-        assert data["verified"] is False
-        assert data["verify_error"] == "Bad signature"
+    cached = c.get("/actions/test.action/versions/1.0.0", headers={"If-None-Match": f'W/"x", {etag}'})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
 
+    stale = c.get("/actions/test.action/versions/1.0.0", headers={"If-None-Match": '"sha256:old"'})
+    assert stale.status_code == 200
+    assert stale.json()["verified"] is True
 
-def test_get_action_unknown_key(client):
+
+def test_get_action_etag_tracks_trust_store(client, ed25519_key, monkeypatch):
     c, db_factory = client
-    payload = {"foo": "bar"}
-    _, sig_b64, _ = generate_key_and_sig(payload)
+    payload = PAYLOAD_FOO_BAR
+    pub_bytes, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
+
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"test-key": ("ed25519", pub_bytes)})
+
+    seed_action(db_factory, "test.action", "1.0.0", payload, "ed25519", "test-key", sig_b64)
 
-    with patch.dict(TRUSTED_KEYS, {}, clear=True):
-        seed_action(db_factory, "test.action", "1.0.0", payload, "ed25519", "unknown-key", sig_b64)
+    first = c.get("/actions/test.action/versions/1.0.0")
+    assert first.json()["verified"] is True
+    etag = first.headers["etag"]
 
-        response = c.get("/actions/test.action/versions/1.0.0")
-        assert response.status_code == 200
-        data = response.json()
-        assert data["verified"] is False
-        assert data["verify_error"] == "Unknown key id"
+    # Dropping the key must invalidate a client's cached "verified: true" copy
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {})
 
+    revalidated = c.get("/actions/test.action/versions/1.0.0", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 200
+    assert revalidated.json()["verify_error"] == "Unknown key id"
+    unknown_etag = revalidated.headers["etag"]
+    assert unknown_etag != etag
 
-def test_verify_endpoint(client):
+    # A different failure reason is a different body, so it needs its own validator too
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"test-key": ("ed25519", b"k" * 32)})
+
+    revalidated = c.get("/actions/test.action/versions/1.0.0", headers={"If-None-Match": unknown_etag})
+    assert revalidated.status_code == 200
+    assert revalidated.json()["verify_error"] == "Bad signature"
+
+
+def test_get_action_non_ascii_kid(client, ed25519_key, monkeypatch):
     c, db_factory = client
-    payload = {"foo": "bar"}
-    pub_bytes, sig_b64, _ = generate_key_and_sig(payload)
+    payload = PAYLOAD_FOO_BAR
+    pub_bytes, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
+    kid = 'clé-✓ "a", b'
 
-    with patch.dict(TRUSTED_KEYS, {"test-key": ("ed25519", pub_bytes)}, clear=True):
-        seed_action(db_factory, "test.action", "1.0.0", payload, "ed25519", "test-key", sig_b64)
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {kid: ("ed25519", pub_bytes)})
 
-        response = c.get("/actions/test.action/versions/1.0.0/verify")
-        assert response.status_code == 200
-        data = response.json()
-        assert data["verified"] is True
-        assert data["kid"] == "test-key"
-        assert data["alg"] == "ed25519"
+    seed_action(db_factory, "test.action", "1.0.0", payload, "ed25519", kid, sig_b64)
+
+    response = c.get("/actions/test.action/versions/1.0.0")
+    assert response.status_code == 200
+    assert response.json()["verified"] is True
+    assert response.json()["signature"]["kid"] == kid
 
+    cached = c.get("/actions/test.action/versions/1.0.0", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
 
-def test_not_found_errors(client):
+
+def test_get_action_tamper(client, ed25519_key, monkeypatch):
+    c, db_factory = client
+    payload = PAYLOAD_FOO_BAR
+    tampered_payload = {"foo": "baz"}
+    pub_bytes, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
+
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"test-key": ("ed25519", pub_bytes)})
+
+    seed_action(db_factory, "test.action", "1.0.0", tampered_payload, "ed25519", "test-key", sig_b64)
+
+    response = c.get("/actions/test.action/versions/1.0.0")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["verified"] is False
+    assert data["verify_error"] == "Bad signature"
+
+
+def test_get_action_unknown_key(client, ed25519_key, monkeypatch):
     c, db_factory = client
+    payload = PAYLOAD_FOO_BAR
+    _, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
+
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {})
+
+    seed_action(db_factory, "test.action", "1.0.0", payload, "ed25519", "unknown-key", sig_b64)
+
+    response = c.get("/actions/test.action/versions/1.0.0")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["verified"] is False
+    assert data["verify_error"] == "Unknown key id"
+
+
+def test_verify_endpoint(client, ed25519_key, monkeypatch):
+    c, db_factory = client
+    payload = PAYLOAD_FOO_BAR
+    pub_bytes, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
+
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"test-key": ("ed25519", pub_bytes)})
+
+    seed_action(db_factory, "test.action", "1.0.0", payload, "ed25519", "test-key", sig_b64)
+
+    response = c.get("/actions/test.action/versions/1.0.0/verify")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["verified"] is True
+    assert data["kid"] == "test-key"
+    assert data["alg"] == "ed25519"
+
+
+@pytest.mark.asyncio
+async def test_not_found_errors(client):
+    _, db_factory = client
+
+    await seed_action_name_async(db_factory, "exists")
+    cached_bodies = main_module._encode_static_error_body.cache_info().currsize
+
+    missing, missing_version, missing_verify, missing_version_verify = await asyncio.gather(
+        call(app, "GET", "/actions/missing/versions/1.0.0"),
+        call(app, "GET", "/actions/exists/versions/missing"),
+        call(app, "GET", "/actions/missing/versions/1.0.0/verify"),
+        call(app, "GET", "/actions/exists/versions/missing/verify"),
+    )
+
+    assert missing.status_code == 404
+    assert missing.headers["content-type"] == "application/json"
+    assert missing.json() == {
+        "error": {"code": "ACTION_NOT_FOUND", "message": "Action 'missing' not found", "details": None}
+    }
 
-    response = c.get("/actions/missing/versions/1.0.0")
-    assert response.status_code == 404
-    assert response.json()["error"]["code"] == "ACTION_NOT_FOUND"
+    assert missing_version.status_code == 404
+    assert missing_version.json()["error"]["code"] == "VERSION_NOT_FOUND"
 
-    seed_action_name(db_factory, "exists")
+    assert missing_verify.status_code == 404
+    assert missing_verify.json()["error"]["code"] == "ACTION_NOT_FOUND"
 
-    response = c.get("/actions/exists/versions/missing")
-    assert response.status_code == 404
-    assert response.json()["error"]["code"] == "VERSION_NOT_FOUND"
+    assert missing_version_verify.status_code == 404
+    assert missing_version_verify.json()["error"]["code"] == "VERSION_NOT_FOUND"
 
+    # 404 messages echo the path, so they must not take slots in the error-body cache
+    assert main_module._encode_static_error_body.cache_info().currsize == cached_bodies
 
-def test_publish_success(client):
+
+def test_publish_success(client, ed25519_key, monkeypatch):
     c, _ = client
     payload = {"description": "Run a command", "parameters": {"cmd": {"type": "string"}}}
-    pub_bytes, sig_b64, _ = generate_key_and_sig(payload)
+    pub_bytes, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
 
     mock_keys = {"pub-key-1": ("ed25519", pub_bytes)}
     sig_block = {"alg": "ed25519", "kid": "pub-key-1", "sig": sig_b64}
 
-    with patch.dict(TRUSTED_KEYS, mock_keys, clear=True), patch.object(main_module, "API_KEY", TEST_API_KEY):
-        resp = _publish(c, "shell.exec", "1.0.0", payload, sig_block)
-        assert resp.status_code == 201
-        data = resp.json()
-        assert data["name"] == "shell.exec"
-        assert data["version"] == "1.0.0"
-        assert data["verified"] is True
-        assert data["schema"] == payload
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", mock_keys)
+    monkeypatch.setattr(main_module, "API_KEY", TEST_API_KEY)
 
-        get_resp = c.get("/actions/shell.exec/versions/1.0.0")
-        assert get_resp.status_code == 200
-        assert get_resp.json()["verified"] is True
+    resp = _publish(c, "shell.exec", "1.0.0", payload, sig_block)
+    assert resp.status_code == 201
+    data = resp.json()
+    assert data["name"] == "shell.exec"
+    assert data["version"] == "1.0.0"
+    assert data["verified"] is True
+    assert data["schema"] == payload
 
+    get_resp = c.get("/actions/shell.exec/versions/1.0.0")
+    assert get_resp.status_code == 200
+    assert get_resp.json()["verified"] is True
 
-def test_publish_idempotent(client):
-    c, _ = client
+
+@pytest.mark.asyncio
+async def test_publish_idempotent(client, ed25519_key, monkeypatch):
     payload = {"description": "Idempotent test"}
-    pub_bytes, sig_b64, _ = generate_key_and_sig(payload)
+    pub_bytes, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
 
     mock_keys = {"pub-key-1": ("ed25519", pub_bytes)}
     sig_block = {"alg": "ed25519", "kid": "pub-key-1", "sig": sig_b64}
 
-    with patch.dict(TRUSTED_KEYS, mock_keys, clear=True), patch.object(main_module, "API_KEY", TEST_API_KEY):
-        resp1 = _publish(c, "idem.action", "1.0.0", payload, sig_block)
-        assert resp1.status_code == 201
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", mock_keys)
+    monkeypatch.setattr(main_module, "API_KEY", TEST_API_KEY)
+
+    # Both publishes race for the insert; exactly one creates the version and the
+    # other is answered as an idempotent replay.
+    path = "/actions/idem.action/versions/1.0.0"
+    publish = {"json": {"schema": payload, "signature": sig_block}, "headers": {"x-api-key": TEST_API_KEY}}
+    responses = await asyncio.gather(call(app, "POST", path, **publish), call(app, "POST", path, **publish))
+    assert sorted(r.status_code for r in responses) == [200, 201]
+    assert responses[0].json() == responses[1].json()
+
+    resp3 = await call(app, "POST", path, **publish)
+    assert resp3.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_publish_concurrent_versions_of_new_action(client, ed25519_key, monkeypatch):
+    payload = {"description": "Concurrent versions"}
+    pub_bytes, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
+    sig_block = {"alg": "ed25519", "kid": "pub-key-1", "sig": sig_b64}
+
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {"pub-key-1": ("ed25519", pub_bytes)})
+    monkeypatch.setattr(main_module, "API_KEY", TEST_API_KEY)
 
-        resp2 = _publish(c, "idem.action", "1.0.0", payload, sig_block)
-        assert resp2.status_code == 200
+    # Both publishes try to create the "fresh.action" row; the loser must still
+    # store its version rather than fail on the actions primary key.
+    publish = {"json": {"schema": payload, "signature": sig_block}, "headers": {"x-api-key": TEST_API_KEY}}
+    responses = await asyncio.gather(
+        call(app, "POST", "/actions/fresh.action/versions/1.0.0", **publish),
+        call(app, "POST", "/actions/fresh.action/versions/2.0.0", **publish),
+    )
+    assert [r.status_code for r in responses] == [201, 201]
+
+    listed = await call(app, "GET", "/actions")
+    assert listed.json()["items"][0]["versions"] == ["1.0.0", "2.0.0"]
 
 
-def test_publish_immutability_conflict(client):
+def test_publish_immutability_conflict(client, ed25519_key, monkeypatch):
     c, _ = client
-    payload_v1 = {"description": "Original"}
-    payload_v2 = {"description": "Modified"}
-    pub_bytes, sig_v1, priv = generate_key_and_sig(payload_v1)
+    pub_bytes, sig_v1, priv = generate_key_and_sig(PAYLOAD_ORIGINAL, ed25519_key)
 
     mock_keys = {"pub-key-1": ("ed25519", pub_bytes)}
     sig_block_v1 = {"alg": "ed25519", "kid": "pub-key-1", "sig": sig_v1}
 
-    with patch.dict(TRUSTED_KEYS, mock_keys, clear=True), patch.object(main_module, "API_KEY", TEST_API_KEY):
-        resp1 = _publish(c, "conflict.action", "1.0.0", payload_v1, sig_block_v1)
-        assert resp1.status_code == 201
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", mock_keys)
+    monkeypatch.setattr(main_module, "API_KEY", TEST_API_KEY)
+
+    resp1 = _publish(c, "conflict.action", "1.0.0", PAYLOAD_ORIGINAL, sig_block_v1)
+    assert resp1.status_code == 201
 
-        canonical_v2 = canonical_dumps(payload_v2)
-        hash_v2 = sha256_bytes(canonical_v2)
-        sig_v2_real = base64.b64encode(priv.sign(hash_v2)).decode("utf-8")
-        sig_block_v2_real = {"alg": "ed25519", "kid": "pub-key-1", "sig": sig_v2_real}
+    sig_v2_real = base64.b64encode(priv.sign(HASH_MODIFIED).signature).decode("utf-8")
+    sig_block_v2_real = {"alg": "ed25519", "kid": "pub-key-1", "sig": sig_v2_real}
 
-        resp2 = _publish(c, "conflict.action", "1.0.0", payload_v2, sig_block_v2_real)
-        assert resp2.status_code == 409
-        assert resp2.json()["error"]["code"] == "IMMUTABLE_VERSION_CONFLICT"
+    resp2 = _publish(c, "conflict.action", "1.0.0", PAYLOAD_MODIFIED, sig_block_v2_real)
+    assert resp2.status_code == 409
+    assert resp2.json()["error"]["code"] == "IMMUTABLE_VERSION_CONFLICT"
 
 
-def test_publish_bad_signature(client):
+def test_publish_bad_signature(client, ed25519_key, monkeypatch):
     c, _ = client
     payload = {"description": "Bad sig"}
-    pub_bytes, _, _ = generate_key_and_sig(payload)
+    pub_bytes, _, _ = generate_key_and_sig(payload, ed25519_key)
 
     mock_keys = {"pub-key-1": ("ed25519", pub_bytes)}
     bad_sig = base64.b64encode(b"x" * 64).decode("utf-8")
     sig_block = {"alg": "ed25519", "kid": "pub-key-1", "sig": bad_sig}
 
-    with patch.dict(TRUSTED_KEYS, mock_keys, clear=True), patch.object(main_module, "API_KEY", TEST_API_KEY):
-        resp = _publish(c, "bad.sig", "1.0.0", payload, sig_block)
-        assert resp.status_code == 400
-        assert resp.json()["error"]["code"] == "BAD_SIGNATURE"
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", mock_keys)
+    monkeypatch.setattr(main_module, "API_KEY", TEST_API_KEY)
 
+    resp = _publish(c, "bad.sig", "1.0.0", payload, sig_block)
+    assert resp.status_code == 400
+    assert resp.json()["error"]["code"] == "BAD_SIGNATURE"
 
-def test_publish_unknown_key(client):
+
+def test_publish_unknown_key(client, ed25519_key, monkeypatch):
     c, _ = client
     payload = {"description": "Unknown key"}
-    _, sig_b64, _ = generate_key_and_sig(payload)
+    _, sig_b64, _ = generate_key_and_sig(payload, ed25519_key)
     sig_block = {"alg": "ed25519", "kid": "nonexistent-key", "sig": sig_b64}
 
-    with patch.dict(TRUSTED_KEYS, {}, clear=True), patch.object(main_module, "API_KEY", TEST_API_KEY):
-        resp = _publish(c, "unknown.key", "1.0.0", payload, sig_block)
-        assert resp.status_code == 400
-        assert resp.json()["error"]["code"] == "UNKNOWN_KEY_ID"
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", {})
+    monkeypatch.setattr(main_module, "API_KEY", TEST_API_KEY)
+
+    resp = _publish(c, "unknown.key", "1.0.0", payload, sig_block)
+    assert resp.status_code == 400
+    assert resp.json()["error"]["code"] == "UNKNOWN_KEY_ID"
 
 
-def test_publish_no_auth(client):
+def test_publish_merkle_batch(client, ed25519_key, monkeypatch):
+    c, _ = client
+    payloads = [{"description": f"Batch item {n}"} for n in range(3)]
+    leaves = [sha256_bytes(canonical_dumps(p)) for p in payloads]
+
+    n01 = merkle_node(leaves[0], leaves[1])
+    root = merkle_node(n01, leaves[2])
+    proofs = [
+        [f"sha256:{leaves[1].hex()}", f"sha256:{leaves[2].hex()}"],
+        [f"sha256:{leaves[0].hex()}", f"sha256:{leaves[2].hex()}"],
+        [f"sha256:{n01.hex()}"],
+    ]
+
+    priv, pub_bytes = ed25519_key
+    root_sig = base64.b64encode(priv.sign(root).signature).decode("utf-8")
+
+    mock_keys = {"batch-key": ("ed25519", pub_bytes)}
+    monkeypatch.setattr(main_module, "TRUSTED_KEYS", mock_keys)
+    monkeypatch.setattr(main_module, "API_KEY", TEST_API_KEY)
+
+    for n, (payload, proof) in enumerate(zip(payloads, proofs)):
+        sig_block = {"alg": "ed25519", "kid": "batch-key", "sig": root_sig, "merkle_proof": proof}
+        resp = _publish(c, "batch.action", f"1.0.{n}", payload, sig_block)
+        assert resp.status_code == 201
+
+        fetched = c.get(f"/actions/batch.action/versions/1.0.{n}")
+        assert fetched.status_code == 200
+        data = fetched.json()
+        assert data["verified"] is True
+        assert data["signature"]["merkle_proof"] == proof
+
+    # A proof for a different leaf does not rebuild the signed root
+    sig_block = {"alg": "ed25519", "kid": "batch-key", "sig": root_sig, "merkle_proof": proofs[2]}
+    resp = _publish(c, "batch.action", "2.0.0", payloads[0], sig_block)
+    assert resp.status_code == 400
+    assert resp.json()["error"]["code"] == "BAD_SIGNATURE"
+
+    sig_block = {"alg": "ed25519", "kid": "batch-key", "sig": root_sig, "merkle_proof": ["not-a-digest"]}
+    resp = _publish(c, "batch.action", "2.0.0", payloads[0], sig_block)
+    assert resp.status_code == 400
+    assert resp.json()["error"]["code"] == "BAD_SIGNATURE"
+
+    # Proofs are stored and re-hashed on every read, so their length is capped
+    sig_block = {"alg": "ed25519", "kid": "batch-key", "sig": root_sig, "merkle_proof": proofs[2] * 65}
+    resp = _publish(c, "batch.action", "2.0.0", payloads[2], sig_block)
+    assert resp.status_code == 422
+
+
+def test_publish_no_auth(client, monkeypatch):
     c, _ = client
     payload = {"description": "No auth"}
     sig_block = {"alg": "ed25519", "kid": "k", "sig": "xxx"}
 
-    with patch.object(main_module, "API_KEY", TEST_API_KEY):
-        resp = _publish(c, "no.auth", "1.0.0", payload, sig_block, api_key=None)
-        assert resp.status_code == 401
-        assert resp.json()["error"]["code"] == "UNAUTHORIZED"
+    monkeypatch.setattr(main_module, "API_KEY", TEST_API_KEY)
+
+    resp = _publish(c, "no.auth", "1.0.0", payload, sig_block, api_key=None)
+    assert resp.status_code == 401
+    assert resp.json()["error"]["code"] == "UNAUTHORIZED"
 
 
-def test_publish_wrong_auth(client):
+def test_publish_wrong_auth(client, monkeypatch):
     c, _ = client
     payload = {"description": "Wrong auth"}
     sig_block = {"alg": "ed25519", "kid": "k", "sig": "xxx"}
 
-    with patch.object(main_module, "API_KEY", TEST_API_KEY):
-        resp = _publish(c, "wrong.auth", "1.0.0", payload, sig_block, api_key="wrong-key")
-        assert resp.status_code == 401
-        assert resp.json()["error"]["code"] == "UNAUTHORIZED"
+    monkeypatch.setattr(main_module, "API_KEY", TEST_API_KEY)
+
+    resp = _publish(c, "wrong.auth", "1.0.0", payload, sig_block, api_key="wrong-key")
+    assert resp.status_code == 401
+    assert resp.json()["error"]["code"] == "UNAUTHORIZED"
 
 
 def test_metrics_endpoint(client):